@@ -25,6 +25,21 @@ cp "${SCRIPT_DIR}/handler.py" "${PACKAGE_DIR}/"
 echo "Installing dependencies..."
 pip install -r "${SCRIPT_DIR}/requirements.txt" -t "${PACKAGE_DIR}" --quiet
 
+# Trim botocore service models to the two services the handler uses.
+# The unused per-service data JSONs dominate the package size and
+# boto3's cold-start import cost. Top-level data files (endpoints,
+# partitions, retry config) are kept.
+BOTOCORE_DATA="${PACKAGE_DIR}/botocore/data"
+if [ -d "${BOTOCORE_DATA}" ]; then
+  echo "Trimming unused botocore service models..."
+  for service_dir in "${BOTOCORE_DATA}"/*/; do
+    case "$(basename "${service_dir}")" in
+      dynamodb|comprehend) ;;
+      *) rm -rf "${service_dir}" ;;
+    esac
+  done
+fi
+
 # Create zip file
 echo "Creating zip file..."
 cd "${PACKAGE_DIR}"
@@ -107,6 +107,7 @@ data "aws_iam_policy_document" "lambda_policy" {
     sid = "AllowDynamoWrites"
     actions = [
       "dynamodb:PutItem",
+      "dynamodb:BatchWriteItem",
     ]
     resources = [aws_dynamodb_table.survey_results.arn]
   }
@@ -115,6 +116,7 @@ data "aws_iam_policy_document" "lambda_policy" {
     sid = "AllowComprehendSentiment"
     actions = [
       "comprehend:DetectSentiment",
+      "comprehend:BatchDetectSentiment",
     ]
     resources = ["*"]
   }
@@ -195,6 +197,10 @@ resource "aws_lambda_event_source_mapping" "sqs_to_lambda" {
 
   batch_size = 10
   enabled    = true
+
+  # Honor the handler's batchItemFailures response so SQS only retries
+  # the messages that actually failed, not the whole batch
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 resource "aws_api_gateway_rest_api" "api" {